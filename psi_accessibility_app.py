@@ -1,19 +1,137 @@
 import streamlit as st
 import pandas as pd
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import html
+import io
 import os
+import re
+import sys
 import time
-import json # To help parse potential error messages
+import threading
+import uuid
+try:
+    import orjson as json_lib # Fast JSON decoding for the PSI and OpenRouter responses
+except ImportError:
+    import json as json_lib # orjson is optional; the standard library decodes the same payloads (bytes included)
+import pyarrow as pa # Installed with Streamlit; used for fast CSV export
+from pyarrow import csv as pa_csv
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import altair as st_alt # For better visualizations
 
 # --- Configuration ---
 API_ENDPOINT = "https://www.googleapis.com/pagespeedonline/v5/runPagespeed"
 OPENROUTER_ENDPOINT = "https://openrouter.ai/api/v1/chat/completions"
-API_CALL_DELAY = 0.8 # Slightly increased delay might be needed for larger responses
+MAX_CONCURRENT = 8 # Number of PSI requests kept in flight at once (PSI_RATE_LIMIT caps the request rate)
+PSI_RATE_LIMIT = 4 # Max PSI requests started per second (the API allows ~240 per minute)
+PSI_CACHE_MAX_ENTRIES = 5000 # Max cached PSI results kept in memory per check type
+GEMINI_CACHE_MAX_ENTRIES = 500 # Max cached Gemini replies kept in memory
+PROGRESS_UPDATE_INTERVAL = 0.5 # Minimum seconds between progress bar/status updates sent to the browser
+# Partial-response mask so Google only sends the parts of the Lighthouse result we read
+ACCESSIBILITY_FIELDS = (
+    "lighthouseResult("
+    "fetchTime,"
+    "categories/accessibility(score,auditRefs/id),"
+    "audits/*(title,description,score,scoreDisplayMode,details/items(node/snippet,snippet)))"
+)
+# Same for the performance run: only the score and each audit's headline values are read,
+# which leaves out the screenshots and per-audit details that make up most of the payload
+PERFORMANCE_FIELDS = (
+    "lighthouseResult("
+    "fetchTime,"
+    "categories/performance/score,"
+    "audits/*(displayValue,score,numericValue))"
+)
 REQUEST_TIMEOUT = 120 # Increased timeout as getting all audits might take longer
 OPENROUTER_TIMEOUT = 30 # Timeout for OpenRouter API calls
+OPENROUTER_BATCH_TIMEOUT = 180 # Timeout for batched OpenRouter calls covering several URLs
+GEMINI_MODEL = "google/gemini-2.5-pro-preview-03-25"
+GEMINI_BATCH_SIZE = 5 # Max URL reports sent to Gemini in a single batched prompt
+# Streamlit writes persist="disk" caches to ~/.streamlit/cache; this marker records the day they were last pruned
+CACHE_DAY_MARKER = os.path.join(os.path.expanduser("~"), ".streamlit", "cache", "psi_accessibility_cache_day")
+
+# --- Shared HTTP Session ---
+@st.cache_resource
+def get_http_session():
+    """
+    Returns a requests.Session shared across reruns so connections to the
+    PageSpeed Insights and OpenRouter APIs are kept alive and reused between calls.
+
+    Returns:
+        requests.Session: Session with a pooled, retrying HTTPS adapter.
+    """
+    session = requests.Session()
+    # Google APIs only gzip responses when the User-Agent contains "gzip";
+    # requests already sends Accept-Encoding: gzip, deflate (plus br when brotli is installed)
+    session.headers['User-Agent'] = f"psi-accessibility-app {session.headers['User-Agent']} (gzip)"
+    retries = Retry(
+        total=5,
+        read=False, # Re-raise read timeouts as-is (requests.Timeout); a retry would rerun Lighthouse outside the rate limiter
+        backoff_factor=1.5,
+        status_forcelist=[429, 500, 502, 503, 504],
+        respect_retry_after_header=True, # Wait as long as the API asks on 429/503 instead of guessing
+        raise_on_status=False # Hand the last response back so the API error message can be shown
+    )
+    # One keep-alive connection per worker thread; pool_block stops extra sockets ever being opened.
+    # Two host pools (PSI and OpenRouter) so neither evicts the other's connections.
+    # Retry only re-sends idempotent methods by default, so OpenRouter POSTs are not repeated.
+    session.mount("https://", HTTPAdapter(
+        pool_connections=2,
+        pool_maxsize=MAX_CONCURRENT,
+        pool_block=True,
+        max_retries=retries
+    ))
+    return session
+
+# --- Rate Limiting ---
+class TokenBucket:
+    """
+    Thread-safe token bucket that only blocks when requests are started faster
+    than the refill rate allows.
+
+    Args:
+        capacity (int): Maximum number of requests that can start back to back.
+        refill_rate (float): Tokens added per second.
+    """
+    def __init__(self, capacity, refill_rate):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.tokens = capacity
+        self.last_refill = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Takes one token, sleeping until one is available."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.last_refill) * self.refill_rate)
+                self.last_refill = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait_time = (1 - self.tokens) / self.refill_rate
+            time.sleep(wait_time)
+
+@st.cache_resource
+def get_rate_limiter():
+    """Returns the token bucket shared by every PSI request in this process."""
+    return TokenBucket(capacity=PSI_RATE_LIMIT, refill_rate=PSI_RATE_LIMIT)
 
 # --- Helper Functions ---
+# Audit categories keyed by (score, scoreDisplayMode) for binary audits,
+# and by scoreDisplayMode alone for audits that carry no pass/fail score
+BINARY_AUDIT_CATEGORIES = {
+    (0, 'binary'): "failed",
+    (1, 'binary'): "passed",
+}
+DISPLAY_MODE_CATEGORIES = {
+    'manual': "manual_check",
+    'informative': "manual_check",
+    'notApplicable': "not_applicable",
+}
+
 def get_audit_category(score, display_mode):
     """
     Categorizes audits into clear groups for better understanding.
@@ -25,147 +143,327 @@ def get_audit_category(score, display_mode):
     Returns:
         str: Category name ('failed', 'manual_check', 'passed', 'not_applicable')
     """
-    if score == 0 and display_mode == 'binary':
-        return "failed"
-    elif display_mode in ['manual', 'informative']:
-        return "manual_check"
-    elif score == 1 and display_mode == 'binary':
-        return "passed"
-    elif display_mode == 'notApplicable':
-        return "not_applicable"
-    else:
-        return "other"
+    return DISPLAY_MODE_CATEGORIES.get(display_mode) or BINARY_AUDIT_CATEGORIES.get((score, display_mode), "other")
 
-# --- Helper Function to Get Core Web Vitals ---
-def get_core_web_vitals(url_to_check, api_key, strategy):
+def clean_urls(raw_urls):
     """
-    Fetches Core Web Vitals metrics from PageSpeed Insights API.
-    
+    Normalizes and validates the entered URLs in a single vectorized pass.
+
+    Args:
+        raw_urls (list): Non-empty, stripped lines from the URL input.
+
+    Returns:
+        tuple: (list of cleaned URLs, list of messages for invalid lines)
+    """
+    urls = pd.Series(raw_urls, dtype=str)
+
+    # Add protocol if missing
+    urls = urls.mask(~urls.str.startswith(('http://', 'https://')), 'https://' + urls)
+
+    # Basic URL format validation
+    valid = urls.str.contains('.', regex=False) & (urls.str.len() > 10)
+    invalid_urls = [f"Line {i+1}: '{url}' - Invalid URL format" for i, url in urls[~valid].items()]
+    return urls[valid].tolist(), invalid_urls
+
+def format_duration(seconds):
+    """Formats a duration in seconds as H:MM:SS, or M:SS when under an hour."""
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}" if hours else f"{minutes}:{seconds:02d}"
+
+# --- PSI Request Helpers ---
+class PSIResponseError(Exception):
+    """Raised when the PSI API answers without a lighthouseResult."""
+
+def fetch_lighthouse_result(url_to_check, api_key, strategy, params):
+    """
+    Sends a rate-limited PSI request and returns its lighthouseResult.
+
     Args:
         url_to_check (str): The URL to analyze.
         api_key (str): Your Google PageSpeed Insights API key.
         strategy (str): 'mobile' or 'desktop'.
-    
+        params (dict): Extra query parameters (category, fields).
+
     Returns:
-        dict: Core Web Vitals metrics or error structure {'error': str}.
+        dict: The lighthouseResult section of the API response.
+
+    Raises:
+        requests.exceptions.RequestException: On network or HTTP errors.
+        PSIResponseError: If the response has no lighthouseResult.
     """
-    # Basic URL validation and cleanup
-    if not url_to_check or not isinstance(url_to_check, str) or not url_to_check.strip():
-        return {"error": "Invalid URL provided"}
-    url_to_check = url_to_check.strip()
-    if not url_to_check.startswith(('http://', 'https://')):
-        url_to_check = 'https://' + url_to_check
+    params = {'url': url_to_check, 'key': api_key, 'strategy': strategy, **params}
+    get_rate_limiter().acquire()
+    response = get_http_session().get(API_ENDPOINT, params=params, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    result = json_lib.loads(response.content)
+
+    lighthouse_result = result.get('lighthouseResult')
+    if not lighthouse_result:
+        raise PSIResponseError(result.get('error', {}).get('message', 'No lighthouseResult in API response.'))
+    return lighthouse_result
+
+def get_cache_day():
+    """Returns the current date, which is passed to the cached fetchers so their results expire daily."""
+    return time.strftime('%Y-%m-%d')
+
+def call_psi(fetch_function, url_to_check, api_key, strategy):
+    """
+    Runs a cached PSI fetch function and turns any failure into an error result.
 
-    params = {
-        'url': url_to_check,
-        'key': api_key,
-        'category': 'PERFORMANCE',  # Core Web Vitals are part of performance
-        'strategy': strategy
-    }
+    Failures are raised inside the cached functions rather than returned, so
+    Streamlit never caches them and the next run retries the URL.
 
-    try:
-        response = requests.get(API_ENDPOINT, params=params, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        result = response.json()
+    Args:
+        fetch_function (callable): One of the cached `fetch_*` functions.
+        url_to_check (str): The URL to analyze.
+        api_key (str): Your Google PageSpeed Insights API key.
+        strategy (str): 'mobile' or 'desktop'.
 
-        lighthouse_result = result.get('lighthouseResult')
-        if not lighthouse_result:
-            error_message = result.get('error', {}).get('message', 'No lighthouseResult in API response.')
-            return {"error": f"API Error: {error_message}"}
+    Returns:
+        dict: The fetch function's result, or an error structure {'error': str}.
+    """
+    # URLs are stripped and given a protocol before they reach this function
+    if not url_to_check or not isinstance(url_to_check, str):
+        return {"error": "Invalid URL provided"}
 
-        # Extract Core Web Vitals metrics
-        audits = lighthouse_result.get('audits', {})
-        
-        # Core Web Vitals metrics
-        vitals = {
-            'lcp': {
-                'name': 'Largest Contentful Paint (LCP)',
-                'value': audits.get('largest-contentful-paint', {}).get('displayValue', 'N/A'),
-                'score': audits.get('largest-contentful-paint', {}).get('score', 0),
-                'numericValue': audits.get('largest-contentful-paint', {}).get('numericValue', 0),
-                'description': 'Measures loading performance. To provide a good user experience, LCP should occur within 2.5 seconds.'
-            },
-            'fid': {
-                'name': 'First Input Delay (FID)',
-                'value': audits.get('max-potential-fid', {}).get('displayValue', 'N/A'),
-                'score': audits.get('max-potential-fid', {}).get('score', 0),
-                'numericValue': audits.get('max-potential-fid', {}).get('numericValue', 0),
-                'description': 'Measures interactivity. To provide a good user experience, pages should have a FID of 100 milliseconds or less.'
-            },
-            'cls': {
-                'name': 'Cumulative Layout Shift (CLS)',
-                'value': audits.get('cumulative-layout-shift', {}).get('displayValue', 'N/A'),
-                'score': audits.get('cumulative-layout-shift', {}).get('score', 0),
-                'numericValue': audits.get('cumulative-layout-shift', {}).get('numericValue', 0),
-                'description': 'Measures visual stability. To provide a good user experience, pages should maintain a CLS of 0.1 or less.'
-            },
-            'inp': {
-                'name': 'Interaction to Next Paint (INP)',
-                'value': audits.get('interaction-to-next-paint', {}).get('displayValue', 'N/A'),
-                'score': audits.get('interaction-to-next-paint', {}).get('score', 0),
-                'numericValue': audits.get('interaction-to-next-paint', {}).get('numericValue', 0),
-                'description': 'Measures responsiveness. A good INP score is 200 milliseconds or less.'
-            }
-        }
-        
-        # Additional performance metrics
-        additional_metrics = {
-            'fcp': {
-                'name': 'First Contentful Paint (FCP)',
-                'value': audits.get('first-contentful-paint', {}).get('displayValue', 'N/A'),
-                'score': audits.get('first-contentful-paint', {}).get('score', 0),
-                'numericValue': audits.get('first-contentful-paint', {}).get('numericValue', 0)
-            },
-            'si': {
-                'name': 'Speed Index',
-                'value': audits.get('speed-index', {}).get('displayValue', 'N/A'),
-                'score': audits.get('speed-index', {}).get('score', 0),
-                'numericValue': audits.get('speed-index', {}).get('numericValue', 0)
-            },
-            'tti': {
-                'name': 'Time to Interactive (TTI)',
-                'value': audits.get('interactive', {}).get('displayValue', 'N/A'),
-                'score': audits.get('interactive', {}).get('score', 0),
-                'numericValue': audits.get('interactive', {}).get('numericValue', 0)
-            },
-            'tbt': {
-                'name': 'Total Blocking Time (TBT)',
-                'value': audits.get('total-blocking-time', {}).get('displayValue', 'N/A'),
-                'score': audits.get('total-blocking-time', {}).get('score', 0),
-                'numericValue': audits.get('total-blocking-time', {}).get('numericValue', 0)
-            }
-        }
-        
-        # Get performance score
-        performance_score = lighthouse_result.get('categories', {}).get('performance', {}).get('score')
-        if performance_score is not None:
-            performance_score = int(performance_score * 100)
-        else:
-            performance_score = 'N/A'
-        
-        return {
-            'performance_score': performance_score,
-            'core_web_vitals': vitals,
-            'additional_metrics': additional_metrics
-        }
+    try:
+        # The current date is part of the cache key, so cached results expire daily
+        return fetch_function(url_to_check, api_key, strategy, get_cache_day())
 
+    except PSIResponseError as e:
+        return {"error": f"API Error: {e}"}
     except requests.exceptions.Timeout:
         return {"error": "Error: Timeout"}
     except requests.exceptions.HTTPError as e:
         error_detail = f"HTTP Error {e.response.status_code}"
         try:
-            error_content = response.json().get('error', {})
+            error_content = json_lib.loads(e.response.content).get('error', {})
             error_detail = f"API Error {error_content.get('code', e.response.status_code)}: {error_content.get('message', 'No details provided')}"
-        except (json.JSONDecodeError, AttributeError):
-            error_detail = f"HTTP Error {e.response.status_code}: {response.text[:200]}"
+        except (json_lib.JSONDecodeError, AttributeError): # Handle non-JSON or unexpected structure
+            error_detail = f"HTTP Error {e.response.status_code}: {e.response.text[:200]}" # Show part of the raw response
         return {"error": error_detail}
     except requests.exceptions.RequestException as e:
         return {"error": f"Error: Network Issue ({e})"}
-    except Exception as e:
+    except (KeyError, AttributeError) as e: # Catch issues navigating the JSON response
+        return {"error": f"Error: Unexpected API Response Structure ({e})"}
+    except Exception as e: # Catch any other unexpected errors
         return {"error": f"Error: Unexpected ({e})"}
 
+# --- Helper Function to Get Core Web Vitals ---
+# Threshold notes shown under each Core Web Vital in the vitals tab
+VITAL_THRESHOLDS = {
+    'lcp': "**Thresholds:** Good < 2.5s | Needs Improvement 2.5s-4s | Poor > 4s",
+    'fid': "**Thresholds:** Good < 100ms | Needs Improvement 100ms-300ms | Poor > 300ms",
+    'cls': "**Thresholds:** Good < 0.1 | Needs Improvement 0.1-0.25 | Poor > 0.25",
+    'inp': "**Thresholds:** Good < 200ms | Needs Improvement 200ms-500ms | Poor > 500ms",
+}
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=PSI_CACHE_MAX_ENTRIES)
+def fetch_core_web_vitals(url_to_check, _api_key, strategy, cache_day):
+    """
+    Fetches and extracts Core Web Vitals metrics. Results are cached on disk
+    per (url, strategy, day); failures raise and are not cached.
+    The leading underscore keeps the API key out of the cache key.
+    """
+    lighthouse_result = fetch_lighthouse_result(url_to_check, _api_key, strategy, {
+        'category': 'PERFORMANCE',  # Core Web Vitals are part of performance
+        'fields': PERFORMANCE_FIELDS
+    })
+
+    # Extract Core Web Vitals metrics
+    audits = lighthouse_result.get('audits', {})
+    
+    # Core Web Vitals metrics
+    vitals = {
+        'lcp': {
+            'name': 'Largest Contentful Paint (LCP)',
+            'value': audits.get('largest-contentful-paint', {}).get('displayValue', 'N/A'),
+            'score': audits.get('largest-contentful-paint', {}).get('score', 0),
+            'numericValue': audits.get('largest-contentful-paint', {}).get('numericValue', 0),
+            'description': 'Measures loading performance. To provide a good user experience, LCP should occur within 2.5 seconds.'
+        },
+        'fid': {
+            'name': 'First Input Delay (FID)',
+            'value': audits.get('max-potential-fid', {}).get('displayValue', 'N/A'),
+            'score': audits.get('max-potential-fid', {}).get('score', 0),
+            'numericValue': audits.get('max-potential-fid', {}).get('numericValue', 0),
+            'description': 'Measures interactivity. To provide a good user experience, pages should have a FID of 100 milliseconds or less.'
+        },
+        'cls': {
+            'name': 'Cumulative Layout Shift (CLS)',
+            'value': audits.get('cumulative-layout-shift', {}).get('displayValue', 'N/A'),
+            'score': audits.get('cumulative-layout-shift', {}).get('score', 0),
+            'numericValue': audits.get('cumulative-layout-shift', {}).get('numericValue', 0),
+            'description': 'Measures visual stability. To provide a good user experience, pages should maintain a CLS of 0.1 or less.'
+        },
+        'inp': {
+            'name': 'Interaction to Next Paint (INP)',
+            'value': audits.get('interaction-to-next-paint', {}).get('displayValue', 'N/A'),
+            'score': audits.get('interaction-to-next-paint', {}).get('score', 0),
+            'numericValue': audits.get('interaction-to-next-paint', {}).get('numericValue', 0),
+            'description': 'Measures responsiveness. A good INP score is 200 milliseconds or less.'
+        }
+    }
+    
+    # Additional performance metrics
+    additional_metrics = {
+        'fcp': {
+            'name': 'First Contentful Paint (FCP)',
+            'value': audits.get('first-contentful-paint', {}).get('displayValue', 'N/A'),
+            'score': audits.get('first-contentful-paint', {}).get('score', 0),
+            'numericValue': audits.get('first-contentful-paint', {}).get('numericValue', 0)
+        },
+        'si': {
+            'name': 'Speed Index',
+            'value': audits.get('speed-index', {}).get('displayValue', 'N/A'),
+            'score': audits.get('speed-index', {}).get('score', 0),
+            'numericValue': audits.get('speed-index', {}).get('numericValue', 0)
+        },
+        'tti': {
+            'name': 'Time to Interactive (TTI)',
+            'value': audits.get('interactive', {}).get('displayValue', 'N/A'),
+            'score': audits.get('interactive', {}).get('score', 0),
+            'numericValue': audits.get('interactive', {}).get('numericValue', 0)
+        },
+        'tbt': {
+            'name': 'Total Blocking Time (TBT)',
+            'value': audits.get('total-blocking-time', {}).get('displayValue', 'N/A'),
+            'score': audits.get('total-blocking-time', {}).get('score', 0),
+            'numericValue': audits.get('total-blocking-time', {}).get('numericValue', 0)
+        }
+    }
+    
+    # Get performance score
+    performance_score = lighthouse_result.get('categories', {}).get('performance', {}).get('score')
+    if performance_score is not None:
+        performance_score = int(performance_score * 100)
+    else:
+        performance_score = 'N/A'
+    
+    return {
+        'performance_score': performance_score,
+        'core_web_vitals': vitals,
+        'additional_metrics': additional_metrics,
+        'fetch_time': lighthouse_result.get('fetchTime')
+    }
+
+def get_core_web_vitals(url_to_check, api_key, strategy):
+    """
+    Fetches Core Web Vitals metrics from PageSpeed Insights API.
+    
+    Args:
+        url_to_check (str): The URL to analyze.
+        api_key (str): Your Google PageSpeed Insights API key.
+        strategy (str): 'mobile' or 'desktop'.
+    
+    Returns:
+        dict: Core Web Vitals metrics or error structure {'error': str}.
+    """
+    return call_psi(fetch_core_web_vitals, url_to_check, api_key, strategy)
+
+# --- Helper Function to Extract Accessibility Audits ---
+NO_SNIPPET = " (No specific item snippet)" # Stored in 'details_snippet' when an audit has no example element
+def extract_accessibility_audits(lighthouse_result):
+    """
+    Pulls the accessibility score and categorized audits out of a lighthouseResult.
+
+    Args:
+        lighthouse_result (dict): The lighthouseResult section of a PSI response.
+
+    Returns:
+        dict: A dictionary containing 'score' (str), 'audits' (list of dicts) and
+              'fetch_time' (ISO timestamp of the Lighthouse run).
+    """
+    # --- Extract Score ---
+    accessibility_category = lighthouse_result.get('categories', {}).get('accessibility', {})
+    score_raw = accessibility_category.get('score')
+    score_display = "N/A"
+    if score_raw is not None:
+        score_display = f"{int(score_raw * 100)}%"
+
+    # --- Extract Detailed Audits ---
+    all_audits_dict = lighthouse_result.get('audits', {})
+    accessibility_audit_refs = accessibility_category.get('auditRefs', [])
+
+    detailed_audits = []
+    for ref in accessibility_audit_refs:
+        audit_id = ref.get('id')
+        audit_data = all_audits_dict.get(audit_id)
+        if not audit_data:
+            continue # Skip if audit data not found
+
+        # Get all audits, not just failures
+        score = audit_data.get('score')
+        display_mode = audit_data.get('scoreDisplayMode')
+        
+        # Categorize the audit
+        category = get_audit_category(score, display_mode)
+        
+        # Passed and not-applicable audits are only listed by title, so keep just what the UI reads
+        if category in ('passed', 'not_applicable'):
+            detailed_audits.append({
+                'id': audit_id,
+                'title': audit_data.get('title', 'N/A'),
+                'category': category
+            })
+            continue
+        
+        # Extract details and snippet
+        snippet = ""
+        items = audit_data.get('details', {}).get('items', [])
+        if items and isinstance(items, list):
+            first_item = items[0]
+            if isinstance(first_item, dict):
+                snippet = first_item.get('node', {}).get('snippet') or first_item.get('snippet', '')
+        
+        # Add failed and manual-check audits with their full details
+        detailed_audits.append({
+            'id': audit_id,
+            'title': audit_data.get('title', 'N/A'),
+            'description': audit_data.get('description', 'N/A'),
+            'score': score,
+            'displayMode': display_mode,
+            'category': category,
+            'details_snippet': snippet if snippet else NO_SNIPPET
+        })
+
+    return {'score': score_display, 'audits': detailed_audits, 'fetch_time': lighthouse_result.get('fetchTime')}
+
+def group_audits(audits):
+    """
+    Splits extracted audits into the groups the detail view shows, in a single pass.
+
+    Args:
+        audits (list): Audit dicts from extract_accessibility_audits.
+
+    Returns:
+        dict: 'failed' and 'manual_check' lists of full audit dicts, and 'passed' and
+              'not_applicable' tuples of (title, id) pairs, which is all their lists show.
+    """
+    groups = {'failed': [], 'manual_check': [], 'passed': [], 'not_applicable': [], 'other': []}
+    for audit in audits:
+        groups[audit['category']].append(audit)
+    groups['passed'] = tuple((audit['title'], audit['id']) for audit in groups['passed'])
+    groups['not_applicable'] = tuple((audit['title'], audit['id']) for audit in groups['not_applicable'])
+    return groups
+
 # --- Helper Function to Call PageSpeed Insights API ---
 # Returns detailed audit results along with the score for all categories
+@st.cache_data(persist="disk", show_spinner=False, max_entries=PSI_CACHE_MAX_ENTRIES)
+def fetch_accessibility_details(url_to_check, _api_key, strategy, cache_day):
+    """
+    Fetches and extracts the accessibility score and audits. Results are cached
+    on disk per (url, strategy, day); failures raise and are not cached.
+    The leading underscore keeps the API key out of the cache key.
+    """
+    lighthouse_result = fetch_lighthouse_result(url_to_check, _api_key, strategy, {
+        'category': 'ACCESSIBILITY',
+        'fields': ACCESSIBILITY_FIELDS
+    })
+
+    return extract_accessibility_audits(lighthouse_result)
+
 def get_psi_accessibility_details(url_to_check, api_key, strategy):
     """
     Fetches the PageSpeed Insights accessibility score and detailed audit results
@@ -177,125 +475,110 @@ def get_psi_accessibility_details(url_to_check, api_key, strategy):
         strategy (str): 'mobile' or 'desktop'.
 
     Returns:
-        dict: A dictionary containing 'score' (str) and 'audits' (list of dicts),
-              or an error structure {'error': str}.
+        dict: A dictionary containing 'score' (str), 'audits' (list of dicts) and
+              'fetch_time' (str), or an error structure {'error': str}.
     """
-    # Basic URL validation and cleanup
-    if not url_to_check or not isinstance(url_to_check, str) or not url_to_check.strip():
-        return {"error": "Invalid URL provided"}
-    url_to_check = url_to_check.strip()
-    if not url_to_check.startswith(('http://', 'https://')):
-        url_to_check = 'https://' + url_to_check
+    return call_psi(fetch_accessibility_details, url_to_check, api_key, strategy)
 
-    params = {
-        'url': url_to_check,
-        'key': api_key,
-        'category': 'ACCESSIBILITY',
-        'strategy': strategy
-    }
+# --- Disk Cache Housekeeping ---
+@st.cache_resource(show_spinner=False)
+def prune_disk_caches(cache_day):
+    """
+    Clears the disk-cached PSI and Gemini results once the day changes. Entries from earlier
+    days are never read again (the day is part of their cache key), but with
+    persist="disk" their files would otherwise stay on disk forever.
 
-    try:
-        response = requests.get(API_ENDPOINT, params=params, timeout=REQUEST_TIMEOUT)
-        response.raise_for_status()
-        result = response.json()
-
-        lighthouse_result = result.get('lighthouseResult')
-        if not lighthouse_result:
-             error_message = result.get('error', {}).get('message', 'No lighthouseResult in API response.')
-             st.warning(f"Could not get lighthouseResult for {url_to_check}. API Message: {error_message}")
-             return {"error": f"API Error: {error_message}"}
-
-
-        # --- Extract Score ---
-        accessibility_category = lighthouse_result.get('categories', {}).get('accessibility', {})
-        score_raw = accessibility_category.get('score')
-        score_display = "N/A"
-        if score_raw is not None:
-            score_display = f"{int(score_raw * 100)}%"
-
-        # --- Extract Detailed Audits ---
-        all_audits_dict = lighthouse_result.get('audits', {})
-        accessibility_audit_refs = accessibility_category.get('auditRefs', [])
-
-        detailed_audits = []
-        for ref in accessibility_audit_refs:
-            audit_id = ref.get('id')
-            audit_data = all_audits_dict.get(audit_id)
-            if not audit_data:
-                continue # Skip if audit data not found
-
-            # Get all audits, not just failures
-            score = audit_data.get('score')
-            display_mode = audit_data.get('scoreDisplayMode')
-            
-            # Extract details and snippet for all audits
-            details = audit_data.get('details', {})
-            snippet = ""
-            items = details.get('items', [])
-            if items and isinstance(items, list) and len(items) > 0:
-                first_item = items[0]
-                if isinstance(first_item, dict):
-                    snippet = first_item.get('node', {}).get('snippet') or first_item.get('snippet', '')
-            
-            # Categorize the audit
-            category = get_audit_category(score, display_mode)
-            
-            # Add all audits to the list with category information
-            detailed_audits.append({
-                'id': audit_id,
-                'title': audit_data.get('title', 'N/A'),
-                'description': audit_data.get('description', 'N/A'),
-                'score': score,
-                'displayMode': display_mode,
-                'category': category,
-                'details_snippet': snippet if snippet else " (No specific item snippet)"
-            })
+    Runs once per process per day; the marker file stops a restart from wiping
+    results that were already cached today.
 
-        return {'score': score_display, 'audits': detailed_audits}
+    Args:
+        cache_day (str): The current cache day, as returned by get_cache_day().
+    """
+    try:
+        with open(CACHE_DAY_MARKER) as marker:
+            if marker.read().strip() == cache_day:
+                return
+    except OSError:
+        pass # No marker yet, so anything on disk predates today
 
-    except requests.exceptions.Timeout:
-        st.warning(f"Request timed out ({REQUEST_TIMEOUT}s) for {url_to_check}")
-        return {"error": "Error: Timeout"}
-    except requests.exceptions.HTTPError as e:
-         error_detail = f"HTTP Error {e.response.status_code}"
-         try:
-             error_content = response.json().get('error', {})
-             error_detail = f"API Error {error_content.get('code', e.response.status_code)}: {error_content.get('message', 'No details provided')}"
-         except (json.JSONDecodeError, AttributeError): # Handle non-JSON or unexpected structure
-              error_detail = f"HTTP Error {e.response.status_code}: {response.text[:200]}" # Show part of the raw response
-         st.warning(f"Failed for {url_to_check}: {error_detail}")
-         return {"error": error_detail}
-    except requests.exceptions.RequestException as e:
-        st.warning(f"Network error for {url_to_check}: {e}")
-        return {"error": f"Error: Network Issue ({e})"}
-    except (KeyError, AttributeError) as e: # Catch issues navigating the JSON response
-         st.warning(f"Unexpected API response structure for {url_to_check}. Check response format. Error: {e}")
-         # Optionally log the full response here for debugging if needed
-         return {"error": f"Error: Unexpected API Response Structure ({e})"}
-    except Exception as e: # Catch any other unexpected errors
-        st.error(f"An unexpected error occurred processing {url_to_check}: {e}")
-        return {"error": f"Error: Unexpected ({e})"}
+    fetch_accessibility_details.clear()
+    fetch_core_web_vitals.clear()
+    request_gemini_analysis.clear()
 
-# --- Function to Call OpenRouter API for Gemini Analysis ---
-def get_gemini_analysis(failed_audits, url):
+    try:
+        os.makedirs(os.path.dirname(CACHE_DAY_MARKER), exist_ok=True)
+        with open(CACHE_DAY_MARKER, "w") as marker:
+            marker.write(cache_day)
+    except OSError:
+        pass # Pruning again on the next process start is harmless
+
+# --- Cached OpenRouter Request ---
+class GeminiResponseError(Exception):
+    """Raised when OpenRouter answers without any analysis text."""
+
+@st.cache_data(persist="disk", show_spinner=False, max_entries=GEMINI_CACHE_MAX_ENTRIES)
+def request_gemini_analysis(prompt, model, _api_key, cache_day, max_tokens=4096, json_output=False, timeout=OPENROUTER_TIMEOUT):
     """
-    Send failed accessibility audits to Gemini 2.5 Pro via OpenRouter for analysis.
-    
+    Sends a prompt to OpenRouter and returns the model's reply. Replies are
+    cached on disk by (prompt, model, day, options), so an identical set of
+    failures is only analyzed once a day; failures raise and are not cached.
+
     Args:
-        failed_audits (list): List of failed accessibility audits
-        url (str): The URL that was analyzed
-        
+        prompt (str): The full prompt, including the failed audits.
+        model (str): OpenRouter model id.
+        _api_key (str): OpenRouter API key (not part of the cache key).
+        cache_day (str): Current day; persisted caches ignore ttl, so this expires replies daily.
+        max_tokens (int): Maximum length of the reply.
+        json_output (bool): Ask the model for a JSON object instead of Markdown.
+        timeout (int): Request timeout in seconds.
+
     Returns:
-        str: Gemini's analysis and recommendations, or error message
+        str: The model's analysis.
     """
-    api_key = os.getenv("OPENROUTER_API_KEY")
-    if not api_key:
-        return "Error: OPENROUTER_API_KEY environment variable not found."
+    # Prepare the request to OpenRouter
+    headers = {
+        "Authorization": f"Bearer {_api_key}",
+        "Content-Type": "application/json"
+    }
     
-    # Format the prompt with all audit information
-    prompt = f"""Analyze these accessibility failures for {url} and provide a concise summary with grading.
+    payload = {
+        "model": model,
+        "messages": [
+            {"role": "user", "content": prompt}
+        ],
+        "max_tokens": max_tokens,
+        "temperature": 0.2
+    }
+    if json_output:
+        payload["response_format"] = {"type": "json_object"}
+    
+    response = get_http_session().post(
+        OPENROUTER_ENDPOINT,
+        headers=headers,
+        json=payload,
+        timeout=timeout
+    )
+    response.raise_for_status()
+    result = json_lib.loads(response.content)
+    
+    # Extract the analysis from the response
+    analysis = result.get("choices", [{}])[0].get("message", {}).get("content", "")
+    if not analysis:
+        raise GeminiResponseError("Received empty response from Gemini model.")
+    
+    # A JSON reply that is cut off at max_tokens or otherwise malformed must raise, so it is never cached
+    if json_output:
+        try:
+            parsed = json_lib.loads(analysis)
+        except json_lib.JSONDecodeError:
+            raise GeminiResponseError("Could not parse Gemini's JSON response (it may have been cut off).")
+        if not isinstance(parsed, dict):
+            raise GeminiResponseError("Gemini's JSON response was not an object.")
+    
+    return analysis
 
-Your response should:
+# --- Functions to Call OpenRouter API for Gemini Analysis ---
+GEMINI_INSTRUCTIONS = """Your response should:
 1. Grade each failure using this system:
    - **F!** (Critical): If the failure would prevent a person with disabilities from receiving information from the webpage - mark as crucial fix that needs immediate attention
    - **F+** (Standard): If the failure doesn't prevent information access but is still a failure that should be fixed
@@ -311,68 +594,209 @@ Your response should:
    - Clear grade indicators for each issue
    - Concise explanations without unnecessary technical jargon
 
-4. At the end, provide a brief summary of the total count of F! vs F+ issues
+4. At the end, provide a brief summary of the total count of F! vs F+ issues"""
 
-Here are the accessibility failures to analyze:
+def format_failed_audits(failed_audits):
+    """
+    Formats failed audits as the numbered issue list used in Gemini prompts.
 
-"""
-    
+    Args:
+        failed_audits (list): List of failed accessibility audits
+
+    Returns:
+        str: One numbered entry per audit with its description and snippet
+    """
+    parts = []
     for i, audit in enumerate(failed_audits, 1):
-        prompt += f"{i}. Issue: {audit.get('title')}\n"
-        prompt += f"   Description: {audit.get('description')}\n"
-        if audit.get('details_snippet') and audit.get('details_snippet') != " (No specific item snippet)":
-            prompt += f"   Code Snippet: {audit.get('details_snippet')}\n"
-        prompt += "\n"
-    
-    # Prepare the request to OpenRouter
-    headers = {
-        "Authorization": f"Bearer {api_key}",
-        "Content-Type": "application/json"
-    }
-    
-    payload = {
-        "model": "google/gemini-2.5-pro-preview-03-25",
-        "messages": [
-            {"role": "user", "content": prompt}
-        ],
-        "max_tokens": 4096,
-        "temperature": 0.2
-    }
+        parts.append(f"{i}. Issue: {audit['title']}\n   Description: {audit['description']}\n")
+        if audit['details_snippet'] != NO_SNIPPET:
+            parts.append(f"   Code Snippet: {audit['details_snippet']}\n")
+        parts.append("\n")
+    return "".join(parts)
+
+def call_gemini(prompt, max_tokens=4096, json_output=False, timeout=OPENROUTER_TIMEOUT):
+    """
+    Sends a prompt to Gemini through the cached OpenRouter request.
+
+    Args:
+        prompt (str): The full prompt.
+        max_tokens (int): Maximum length of the reply.
+        json_output (bool): Ask the model for a JSON object instead of Markdown.
+        timeout (int): Request timeout in seconds.
+
+    Returns:
+        str: Gemini's reply, or an error message starting with "Error:"
+    """
+    api_key = os.getenv("OPENROUTER_API_KEY")
+    if not api_key:
+        return "Error: OPENROUTER_API_KEY environment variable not found."
     
     try:
-        response = requests.post(
-            OPENROUTER_ENDPOINT,
-            headers=headers,
-            json=payload,
-            timeout=OPENROUTER_TIMEOUT
-        )
-        response.raise_for_status()
-        result = response.json()
-        
-        # Extract the analysis from the response
-        analysis = result.get("choices", [{}])[0].get("message", {}).get("content", "")
-        if not analysis:
-            return "Error: Received empty response from Gemini model."
-        
-        return analysis
+        return request_gemini_analysis(prompt, GEMINI_MODEL, api_key, get_cache_day(), max_tokens, json_output, timeout)
     
+    except GeminiResponseError as e:
+        return f"Error: {e}"
     except requests.exceptions.Timeout:
         return "Error: Request to OpenRouter timed out."
     except requests.exceptions.HTTPError as e:
         error_detail = f"HTTP Error {e.response.status_code}"
         try:
-            error_content = response.json().get('error', {})
+            error_content = json_lib.loads(e.response.content).get('error', {})
             error_detail = f"API Error {error_content.get('code', e.response.status_code)}: {error_content.get('message', 'No details provided')}"
-        except (json.JSONDecodeError, AttributeError):
-            error_detail = f"HTTP Error {e.response.status_code}: {response.text[:200]}"
+        except (json_lib.JSONDecodeError, AttributeError):
+            error_detail = f"HTTP Error {e.response.status_code}: {e.response.text[:200]}"
         return f"Error: {error_detail}"
     except requests.exceptions.RequestException as e:
         return f"Error: Network error occurred: {e}"
     except Exception as e:
         return f"Error: Unexpected error occurred: {e}"
 
+def get_gemini_analysis(failed_audits, url):
+    """
+    Send failed accessibility audits to Gemini 2.5 Pro via OpenRouter for analysis.
+    
+    Args:
+        failed_audits (list): List of failed accessibility audits
+        url (str): The URL that was analyzed
+        
+    Returns:
+        str: Gemini's analysis and recommendations, or error message
+    """
+    # Format the prompt with all audit information
+    prompt = f"""Analyze these accessibility failures for {url} and provide a concise summary with grading.
+
+{GEMINI_INSTRUCTIONS}
+
+Here are the accessibility failures to analyze:
+
+"""
+    prompt += format_failed_audits(failed_audits)
+    
+    return call_gemini(prompt)
+
+def get_gemini_analysis_batch(urls_and_audits):
+    """
+    Sends the failed audits of several URLs to Gemini in one request and splits
+    the reply back into one analysis per URL.
+    
+    Args:
+        urls_and_audits (list): (url label, failed audits) tuples, at most GEMINI_BATCH_SIZE
+        
+    Returns:
+        list: One analysis (or error message) per input tuple, in the same order
+    """
+    prompt = f"""Analyze the accessibility failures of each numbered page below and provide, for each page, a concise summary with grading.
+
+Follow these instructions for each page's analysis:
+
+{GEMINI_INSTRUCTIONS}
+
+Respond with a JSON object that maps each page number (as a string, e.g. "1") to that page's analysis written as a Markdown string.
+
+"""
+    prompt += "".join(
+        f"### Page {page_number}: {url}\n\n{format_failed_audits(failed_audits)}"
+        for page_number, (url, failed_audits) in enumerate(urls_and_audits, 1)
+    )
+    
+    reply = call_gemini(
+        prompt,
+        max_tokens=4096 * len(urls_and_audits),
+        json_output=True,
+        timeout=OPENROUTER_BATCH_TIMEOUT
+    )
+    if reply.startswith("Error:"):
+        return [reply] * len(urls_and_audits)
+    
+    # request_gemini_analysis only returns batched replies that parse to a JSON object
+    analyses = json_lib.loads(reply)
+    results = []
+    for page_number in range(1, len(urls_and_audits) + 1):
+        analysis = analyses.get(str(page_number))
+        # Only Markdown strings are usable; nested objects or lists would be stored and shown as their repr
+        if isinstance(analysis, str) and analysis.strip():
+            results.append(analysis)
+        else:
+            results.append("Error: Gemini returned no analysis for this URL.")
+    return results
+
+# --- Helper Function to Build the Audit Overview Chart ---
+AUDIT_CHART_CATEGORIES = ["Failed", "Manual Check", "Passed", "Not Applicable"]
+
+@st.cache_data(show_spinner=False)
+def build_audit_chart_spec(counts):
+    """
+    Builds the audit results donut chart as a Vega-Lite spec.
+
+    Args:
+        counts (tuple): Audit counts in AUDIT_CHART_CATEGORIES order.
+
+    Returns:
+        dict: Vega-Lite spec for st.vega_lite_chart.
+    """
+    # Create the pie chart data
+    summary_df = pd.DataFrame({
+        "Category": AUDIT_CHART_CATEGORIES,
+        "Count": list(counts)
+    })
+
+    # Create a pie chart
+    chart = st_alt.Chart(summary_df).mark_arc(innerRadius=50).encode(
+        theta=st_alt.Theta('Count:Q', stack=True),
+        color=st_alt.Color('Category:N',
+            scale=st_alt.Scale(
+                domain=AUDIT_CHART_CATEGORIES,
+                range=['#ff4b4b', '#ffa500', '#00cc44', '#aaaaaa']
+            ),
+            legend=st_alt.Legend(
+                title="Category",
+                orient="bottom",
+                labelFontSize=11,
+                titleFontSize=12,
+                columns=2
+            )
+        ),
+        tooltip=[
+            st_alt.Tooltip('Category:N', title='Category'),
+            st_alt.Tooltip('Count:Q', title='Count'),
+            st_alt.Tooltip('Count:Q', title='Percentage', format='.1%', aggregate='mean')
+        ]
+    ).properties(
+        width=250,
+        height=250,
+        title={
+            "text": f"Audit Results Distribution",
+            "fontSize": 14,
+            "anchor": "start"
+        }
+    )
+    return chart.to_dict()
+
+# --- Helper Function to Render Audit Lists ---
+INLINE_CODE_PATTERN = re.compile(r"`([^`]+)`")
+
+@st.cache_data(show_spinner=False)
+def render_audits_html(audit_pairs):
+    """
+    Renders a list of audits as a single HTML list, so the browser doesn't
+    have to run it through the Markdown parser.
+
+    Args:
+        audit_pairs (tuple): (title, id) pairs, one per audit.
+
+    Returns:
+        str: HTML list for st.markdown(..., unsafe_allow_html=True).
+    """
+    # Titles come from the API and may contain markup, so escape them; `code` spans become <code>
+    items = []
+    for title, audit_id in audit_pairs:
+        title_html = INLINE_CODE_PATTERN.sub(r"<code>\1</code>", html.escape(title))
+        items.append(f"<li><b>{title_html}</b> (ID: <code>{html.escape(audit_id)}</code>)</li>")
+    return f"<ul>{''.join(items)}</ul>"
+
 # --- Streamlit App UI ---
 st.set_page_config(page_title="Detailed PSI Accessibility Test", layout="wide")
+prune_disk_caches(get_cache_day())
 st.title("PageSpeed Insights Accessibility Tests")
 st.markdown("""
 Paste your URLs in the text box below (one URL per line, maximum 1000 URLs). The app fetches the overall **WCAG 2.0 AA Accessibility Score**
@@ -384,7 +808,8 @@ and provides details on specific audits that require attention for each URL usin
 # --- Important Considerations Expander ---
 with st.expander("⚠️ Important Considerations & How to Interpret Results"):
     st.markdown(f"""
-    *   **API Limits:** Google enforces [rate limits](https://developers.google.com/speed/docs/insights/v5/reference/limits). Large lists might hit these. The app uses a `{API_CALL_DELAY}s` delay.
+    *   **API Limits:** Google enforces [rate limits](https://developers.google.com/speed/docs/insights/v5/reference/limits). Large lists might hit these. The app runs up to `{MAX_CONCURRENT}` requests in parallel, starts at most `{PSI_RATE_LIMIT}` per second, and retries rate-limited (HTTP 429) requests with exponential backoff.
+    *   **Caching:** Results are cached on disk for the rest of the day, so re-running the same URLs is near-instant and does not use API quota. Tick **Force refresh** to fetch fresh results.
     *   **Automated Testing Limitations:** This tool uses Lighthouse for *automated* checks based on WCAG principles. **Automated testing can only detect about 30% of accessibility issues**. Manual testing with screen readers and real users with disabilities is essential for full compliance.
     *   **Understanding Audit Categories:**
         * **Failed Audits ❌** - Accessibility issues automatically detected that must be fixed. These violate WCAG guidelines and affect users with disabilities.
@@ -415,21 +840,22 @@ if not openrouter_api_key:
 st.info("The will analyze URLs using both **desktop** and **mobile** strategies for comprehensive accessibility testing.")
 
 # --- Session State Initialization ---
-# Use session state to store results across reruns (e.g., when selecting a URL for details)
-if 'results_df' not in st.session_state:
+# Use session state to store results across reruns (e.g., when selecting a URL for details).
+# API responses themselves are cached by the fetch functions, so this only holds the current run.
+def reset_results():
+    """Clears every stored result, before a new run or after a failed one."""
     st.session_state.results_df = None
-if 'detailed_results' not in st.session_state:
-    st.session_state.detailed_results = {} # Store detailed audits keyed by original index
-if 'gemini_analyses' not in st.session_state:
     st.session_state.gemini_analyses = {} # Store Gemini analyses keyed by URL
-if 'desktop_results' not in st.session_state:
     st.session_state.desktop_results = {}
-if 'mobile_results' not in st.session_state:
     st.session_state.mobile_results = {}
-if 'desktop_vitals' not in st.session_state:
     st.session_state.desktop_vitals = {}
-if 'mobile_vitals' not in st.session_state:
     st.session_state.mobile_vitals = {}
+    st.session_state.fetch_times = [] # ISO timestamp of the oldest Lighthouse run per URL
+    st.session_state.csv_output = None # Memoized CSV export and the fingerprint it was built from
+    st.session_state.csv_fingerprint = None
+
+if 'results_df' not in st.session_state:
+    reset_results()
 
 
 # 3. URL Input & Processing Logic
@@ -443,6 +869,11 @@ url_input = st.text_area(
     help="Enter up to 1000 URLs, one per line. URLs should include the full protocol (https://)"
 )
 
+force_refresh = st.checkbox(
+    "Force refresh",
+    help="Ignore cached PageSpeed Insights results and fetch every URL again. Results are otherwise reused for the rest of the day."
+)
+
 # Add a button to process URLs
 process_urls = st.button("Analyze URLs", type="primary")
 
@@ -461,30 +892,7 @@ if process_urls and url_input.strip():
         st.warning("⚠️ No URLs found in the input. Please enter at least one URL.")
         st.stop()
     
-    # Clean and validate URLs
-    cleaned_urls = []
-    invalid_urls = []
-    
-    for i, url in enumerate(raw_urls):
-        # Basic URL validation and cleanup
-        if not url or not isinstance(url, str):
-            invalid_urls.append(f"Line {i+1}: Empty or invalid URL")
-            continue
-            
-        url = url.strip()
-        if not url:
-            continue
-            
-        # Add protocol if missing
-        if not url.startswith(('http://', 'https://')):
-            url = 'https://' + url
-            
-        # Basic URL format validation
-        if not ('.' in url and len(url) > 10):
-            invalid_urls.append(f"Line {i+1}: '{url}' - Invalid URL format")
-            continue
-            
-        cleaned_urls.append(url)
+    cleaned_urls, invalid_urls = clean_urls(raw_urls)
     
     if invalid_urls:
         with st.expander("⚠️ Invalid URLs Found", expanded=False):
@@ -495,179 +903,188 @@ if process_urls and url_input.strip():
         st.error("❌ **Error:** No valid URLs found after validation.")
         st.stop()
     
-    # Create DataFrame from cleaned URLs
-    df = pd.DataFrame({'urls': cleaned_urls})
-    df.reset_index(drop=True, inplace=True)
-    
     # Clear previous results when new URLs are processed
-    st.session_state.results_df = None
-    st.session_state.detailed_results = {}
-    st.session_state.gemini_analyses = {}
-    st.session_state.desktop_results = {}
-    st.session_state.mobile_results = {}
-    st.session_state.desktop_vitals = {}
-    st.session_state.mobile_vitals = {}
+    reset_results()
     
     process_file = True
-    st.success(f"Ready to process {len(df)} URLs using both desktop and mobile strategies...")
+    st.success(f"Ready to process {len(cleaned_urls)} URLs using both desktop and mobile strategies...")
 
 elif process_urls and not url_input.strip():
     st.warning("⚠️ Please enter some URLs in the text area above.")
 
 if process_file:
     try:
-
-        desktop_scores = []
-        mobile_scores = []
-        st.session_state.detailed_results = {} # Reset details for new run
-        st.session_state.desktop_results = {}
-        st.session_state.mobile_results = {}
-        st.session_state.desktop_vitals = {}
-        st.session_state.mobile_vitals = {}
+        if force_refresh:
+            # The caches are shared by every session, so only drop today's entries for the URLs being re-run
+            cache_day = get_cache_day()
+            for url in cleaned_urls:
+                for strategy in ('desktop', 'mobile'):
+                    fetch_accessibility_details.clear(url, api_key, strategy, cache_day)
+                    fetch_core_web_vitals.clear(url, api_key, strategy, cache_day)
+
+        desktop_scores = [None] * len(cleaned_urls)
+        mobile_scores = [None] * len(cleaned_urls)
+        fetch_times = [None] * len(cleaned_urls) # Oldest Lighthouse run per URL; cached results can be up to a day old
         progress_bar = st.progress(0)
         status_text = st.empty()
-        total_urls = len(df) * 4  # Each URL is processed 4 times (desktop/mobile for both accessibility and vitals)
-        start_time = time.time()
-        
-        # Process counter for progress calculation
-        process_count = 0
+        total_urls = len(cleaned_urls) * 4  # Each URL is processed 4 times (desktop/mobile for both accessibility and vitals)
+        start_time = time.monotonic()
 
-        for i, row in df.iterrows(): # Use iterrows to get index `i` easily
-            url = row['urls']
-            
-            # Process desktop strategy
-            process_count += 1
-            current_progress = process_count / total_urls
-            elapsed_time = time.time() - start_time
-            avg_time_per_process = elapsed_time / process_count if process_count > 0 else elapsed_time
-            estimated_remaining = (total_urls - process_count) * avg_time_per_process if avg_time_per_process > 0 else 0
-
-            status_text.text(
-                f"⚙️ Processing URL {i+1}/{len(df)} (Desktop): {url}\n"
-                f"⏳ Estimated time remaining: {time.strftime('%M:%S', time.gmtime(estimated_remaining))}"
-            )
+        # Each check: (label, API function, strategy, score list or None, session state results dict)
+        checks = [
+            ("Desktop", get_psi_accessibility_details, 'desktop', desktop_scores, st.session_state.desktop_results),
+            ("Mobile", get_psi_accessibility_details, 'mobile', mobile_scores, st.session_state.mobile_results),
+            ("Desktop Vitals", get_core_web_vitals, 'desktop', None, st.session_state.desktop_vitals),
+            ("Mobile Vitals", get_core_web_vitals, 'mobile', None, st.session_state.mobile_vitals),
+        ]
 
-            # Call the API function for desktop
-            desktop_result = get_psi_accessibility_details(url, api_key, 'desktop')
+        # Failed checks are collected and shown once at the end instead of one warning each
+        errors = []
 
-            if "error" in desktop_result:
-                desktop_scores.append(desktop_result["error"])
-                st.session_state.desktop_results[i] = [{"error": desktop_result["error"]}]
-            else:
-                desktop_scores.append(desktop_result['score'])
-                st.session_state.desktop_results[i] = desktop_result['audits']
-
-            progress_bar.progress(current_progress)
-            time.sleep(API_CALL_DELAY)
-            
-            # Process mobile strategy
-            process_count += 1
-            current_progress = process_count / total_urls
-            elapsed_time = time.time() - start_time
-            avg_time_per_process = elapsed_time / process_count if process_count > 0 else elapsed_time
-            estimated_remaining = (total_urls - process_count) * avg_time_per_process if avg_time_per_process > 0 else 0
-
-            status_text.text(
-                f"⚙️ Processing URL {i+1}/{len(df)} (Mobile): {url}\n"
-                f"⏳ Estimated time remaining: {time.strftime('%M:%S', time.gmtime(estimated_remaining))}"
-            )
-
-            # Call the API function for mobile
-            mobile_result = get_psi_accessibility_details(url, api_key, 'mobile')
-
-            if "error" in mobile_result:
-                mobile_scores.append(mobile_result["error"])
-                st.session_state.mobile_results[i] = [{"error": mobile_result["error"]}]
-            else:
-                mobile_scores.append(mobile_result['score'])
-                st.session_state.mobile_results[i] = mobile_result['audits']
-
-            progress_bar.progress(current_progress)
-            time.sleep(API_CALL_DELAY)
-            
-            # Process desktop Core Web Vitals
-            process_count += 1
-            current_progress = process_count / total_urls
-            elapsed_time = time.time() - start_time
-            avg_time_per_process = elapsed_time / process_count if process_count > 0 else elapsed_time
-            estimated_remaining = (total_urls - process_count) * avg_time_per_process if avg_time_per_process > 0 else 0
-
-            status_text.text(
-                f"⚙️ Processing URL {i+1}/{len(df)} (Desktop Vitals): {url}\n"
-                f"⏳Estimated time remaining: {time.strftime('%M:%S', time.gmtime(estimated_remaining))}"
-            )
-
-            # Call the API function for desktop vitals
-            desktop_vitals_result = get_core_web_vitals(url, api_key, 'desktop')
-
-            if "error" in desktop_vitals_result:
-                st.session_state.desktop_vitals[i] = {"error": desktop_vitals_result["error"]}
-            else:
-                st.session_state.desktop_vitals[i] = desktop_vitals_result
-
-            progress_bar.progress(current_progress)
-            time.sleep(API_CALL_DELAY)
-            
-            # Process mobile Core Web Vitals
-            process_count += 1
-            current_progress = process_count / total_urls
-            elapsed_time = time.time() - start_time
-            avg_time_per_process = elapsed_time / process_count if process_count > 0 else elapsed_time
-            estimated_remaining = (total_urls - process_count) * avg_time_per_process if avg_time_per_process > 0 else 0
-
-            status_text.text(
-                f"⚙️ Processing URL {i+1}/{len(df)} (Mobile Vitals): {url}\n"
-                f"⏳ Estimated time remaining: {time.strftime('%M:%S', time.gmtime(estimated_remaining))}"
-            )
-
-            # Call the API function for mobile vitals
-            mobile_vitals_result = get_core_web_vitals(url, api_key, 'mobile')
-
-            if "error" in mobile_vitals_result:
-                st.session_state.mobile_vitals[i] = {"error": mobile_vitals_result["error"]}
-            else:
-                st.session_state.mobile_vitals[i] = mobile_vitals_result
-
-            progress_bar.progress(current_progress)
-            time.sleep(API_CALL_DELAY)
-
-        end_time = time.time()
-        total_time = end_time - start_time
-        status_text.success(f"✅ Processing complete for {len(df)} URLs (desktop and mobile accessibility + Core Web Vitals) in {time.strftime('%M minutes %S seconds', time.gmtime(total_time))}!")
+        # Process counter for progress calculation
+        process_count = 0
+        last_update = 0.0
 
-        # Store results in session state DataFrame
-        df['Desktop Score'] = desktop_scores
-        df['Mobile Score'] = mobile_scores
-        st.session_state.results_df = df # Save the DataFrame to session state
+        # Fire the API calls in parallel; the work is network-bound, so threads are enough.
+        # Streamlit calls are only made from this (the script) thread as results come in.
+        executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT)
+        try:
+            futures = {}
+            for i, url in enumerate(cleaned_urls):
+                for label, check_function, strategy, scores, results in checks:
+                    future = executor.submit(check_function, url, api_key, strategy)
+                    futures[future] = (i, url, label, scores, results)
+
+            for future in as_completed(futures):
+                i, url, label, scores, results = futures[future]
+                result = future.result()
+
+                if "error" in result:
+                    errors.append((url, label, result["error"]))
+                elif result.get('fetch_time'):
+                    # ISO 8601 timestamps in UTC compare correctly as strings
+                    fetch_times[i] = min(fetch_times[i] or result['fetch_time'], result['fetch_time'])
+
+                if scores is None: # Core Web Vitals
+                    results[i] = result
+                elif "error" in result:
+                    scores[i] = result["error"]
+                    results[i] = {"error": result["error"]}
+                else:
+                    # Titles and descriptions repeat for every URL, so keep a single shared copy of each
+                    for audit in result['audits']:
+                        audit['title'] = sys.intern(audit['title'])
+                        if 'description' in audit:
+                            audit['description'] = sys.intern(audit['description'])
+                    scores[i] = result['score']
+                    # Grouped once here so reruns of the detail view don't re-split the audits
+                    results[i] = group_audits(result['audits'])
+
+                process_count += 1
+
+                # Each update is a message to the browser, so throttle them; always show the last one
+                now = time.monotonic()
+                if now - last_update >= PROGRESS_UPDATE_INTERVAL or process_count == total_urls:
+                    last_update = now
+                    estimated_remaining = (total_urls - process_count) * (now - start_time) / process_count
+
+                    status_text.text(
+                        f"⚙️ Completed {process_count}/{total_urls} checks ({label}): {url}\n"
+                        f"⏳ Estimated time remaining: {format_duration(estimated_remaining)}"
+                    )
+                    progress_bar.progress(process_count / total_urls)
+        finally:
+            # A stop or rerun raises out of the next st call above; cancel the queued checks instead of
+            # waiting (and spending API quota) on results nobody will see. In-flight requests just finish.
+            executor.shutdown(wait=False, cancel_futures=True)
+
+        total_time = time.monotonic() - start_time
+        status_text.success(f"✅ Processing complete for {len(cleaned_urls)} URLs (desktop and mobile accessibility + Core Web Vitals) in {format_duration(total_time)}!")
+
+        if errors:
+            with st.expander(f"⚠️ {len(errors)} checks failed", expanded=False):
+                st.dataframe(pd.DataFrame(errors, columns=['URL', 'Check', 'Error']), hide_index=True, use_container_width=True)
+
+        # Build the results DataFrame only now that all scores are in, and save it to session state
+        st.session_state.results_df = pd.DataFrame({
+            'urls': cleaned_urls,
+            'Desktop Score': desktop_scores,
+            'Mobile Score': mobile_scores
+        })
+        # Kept beside the DataFrame rather than in it, so the CSV export's columns stay unchanged
+        st.session_state.fetch_times = fetch_times
+        st.session_state.results_run_id = uuid.uuid4().hex # Unique across sessions, used to key cached downloads
 
 
-    except pd.errors.EmptyDataError:
-        st.error("❌ **Error:** The uploaded CSV file appears to be empty.")
-        st.session_state.results_df = None # Clear results on error
-        st.session_state.detailed_results = {}
-        st.session_state.gemini_analyses = {}
-        st.session_state.desktop_vitals = {}
-        st.session_state.mobile_vitals = {}
     except Exception as e:
-        st.error(f"An unexpected error occurred while processing the file: {e}")
+        st.error(f"An unexpected error occurred while processing the URLs: {e}")
         st.exception(e)
-        st.session_state.results_df = None # Clear results on error
-        st.session_state.detailed_results = {}
-        st.session_state.gemini_analyses = {}
-        st.session_state.desktop_vitals = {}
-        st.session_state.mobile_vitals = {}
+        reset_results() # Clear results on error
 
 # --- Display Results ---
 if st.session_state.results_df is not None:
-    # st.subheader("📊 Summary Results")
-    # st.dataframe(st.session_state.results_df, use_container_width=True)
+    # Shown as one Arrow-serialized grid; its toolbar can also export the table as CSV in the
+    # browser. The download button below stays because only it includes the Gemini analyses.
+    st.subheader("📊 Summary Results")
+    st.dataframe(st.session_state.results_df, use_container_width=True)
 
     # --- Detailed View Section ---
     st.subheader("Detailed Audit Report")
     st.markdown("Select a URL from the list above to view its detailed accessibility audit results.")
 
     # Create options for the select box: "Index: URL"
-    url_options = [f"{idx}: {url}" for idx, url in st.session_state.results_df['urls'].items()]
+    # They only change when a new run completes, so build them once per run rather than on every rerun
+    if st.session_state.get('url_options_run_id') != st.session_state.results_run_id:
+        st.session_state.result_urls = st.session_state.results_df['urls'].tolist()
+        st.session_state.url_options = [f"{idx}: {url}" for idx, url in enumerate(st.session_state.result_urls)]
+        st.session_state.url_options_run_id = st.session_state.results_run_id
+    result_urls = st.session_state.result_urls
+    url_options = st.session_state.url_options
+
+    def store_gemini_analysis(url, device_type, analysis):
+        """
+        Saves a Gemini analysis; the results DataFrame only gets it when exported.
+        Error messages are not saved, so the report stays pending and can be retried.
+
+        Returns:
+            bool: True if the analysis was saved.
+        """
+        if analysis.startswith("Error:"):
+            return False
+        st.session_state.gemini_analyses[f"{url}_{device_type.lower()}"] = analysis
+        return True
+
+    # Batch Gemini Analysis: one request covers the failures of several URLs
+    if openrouter_api_key:
+        # Failures from the last "Analyze All" run, kept across its st.rerun() so they can be shown
+        for message in st.session_state.pop('gemini_batch_errors', []):
+            st.error(message)
+        
+        # Keyed like gemini_analyses, so a URL entered twice is only sent (and counted) once
+        pending_reports = {}
+        for idx, url in enumerate(result_urls):
+            for device_type, device_results in (("Desktop", st.session_state.desktop_results), ("Mobile", st.session_state.mobile_results)):
+                failed = device_results.get(idx, {}).get('failed')
+                analysis_key = f"{url}_{device_type.lower()}"
+                if failed and analysis_key not in st.session_state.gemini_analyses:
+                    pending_reports.setdefault(analysis_key, (url, device_type, failed))
+        pending_reports = list(pending_reports.values())
+        
+        if pending_reports and st.button(f"Analyze All Failed Audits with Gemini ({len(pending_reports)} reports)"):
+            gemini_progress = st.progress(0, text="Sending failed audits to Gemini for analysis...")
+            batch_errors = []
+            for start in range(0, len(pending_reports), GEMINI_BATCH_SIZE):
+                batch = pending_reports[start:start + GEMINI_BATCH_SIZE]
+                analyses = get_gemini_analysis_batch([(f"{url} ({device_type})", failed) for url, device_type, failed in batch])
+                for (url, device_type, _), analysis in zip(batch, analyses):
+                    if not store_gemini_analysis(url, device_type, analysis):
+                        batch_errors.append(f"{url} ({device_type}): {analysis}")
+                done = min(start + GEMINI_BATCH_SIZE, len(pending_reports))
+                gemini_progress.progress(done / len(pending_reports), text=f"Analyzed {done}/{len(pending_reports)} reports with Gemini...")
+            
+            # Rerun to update the UI
+            st.session_state.gemini_batch_errors = batch_errors
+            st.rerun()
 
     if not url_options:
         st.warning("No URLs were processed successfully to show details for.")
@@ -677,28 +1094,36 @@ if st.session_state.results_df is not None:
         if selected_option:
             # Extract the index from the selected option string
             selected_index = int(selected_option.split(":")[0])
-            current_url = st.session_state.results_df.loc[selected_index, 'urls']
+            current_url = result_urls[selected_index]
             
             st.markdown(f"**Details for:** `{current_url}`")
+            fetched_at = st.session_state.fetch_times[selected_index]
+            if fetched_at:
+                st.caption(f"Lighthouse results from {fetched_at[:16].replace('T', ' ')} UTC")
             
-            # Create tabs for desktop, mobile, and core web vitals results
-            desktop_tab, mobile_tab, vitals_tab = st.tabs(["Desktop Results", "Mobile Results", "Core Web Vitals"])
+            # Tab-like selector for desktop, mobile, and core web vitals results. Unlike st.tabs,
+            # only the selected view's body runs, so each rerun renders one report instead of three
+            active_view = st.radio(
+                "Results view",
+                ["Desktop Results", "Mobile Results", "Core Web Vitals"],
+                horizontal=True,
+                label_visibility="collapsed",
+                key="active_results_view"
+            )
             
             # Function to display audit results for a specific device type
-            def display_audit_results(device_type, audits_to_display):
-                if not audits_to_display:
-                    st.info(f"No accessibility audits were found for this URL on {device_type}, or an error occurred during its analysis.")
+            def display_audit_results(device_type, audit_groups):
+                if "error" in audit_groups: # Check if the stored detail is an error message
+                    st.error(f"Could not retrieve details due to a previous error: {audit_groups['error']}")
                     return
                 
-                if "error" in audits_to_display[0]: # Check if the stored detail is an error message
-                    st.error(f"Could not retrieve details due to a previous error: {audits_to_display[0]['error']}")
+                if not any(audit_groups.values()):
+                    st.info(f"No accessibility audits were found for this URL on {device_type}, or an error occurred during its analysis.")
                     return
                 
-                # Group audits by category
-                failed_audits = [a for a in audits_to_display if a.get('category') == 'failed']
-                manual_audits = [a for a in audits_to_display if a.get('category') == 'manual_check']
-                passed_audits = [a for a in audits_to_display if a.get('category') == 'passed']
-                na_audits = [a for a in audits_to_display if a.get('category') == 'not_applicable']
+                # Audits were grouped by category when the results were stored
+                failed_audits, manual_audits, passed_audits, na_audits = (
+                    audit_groups['failed'], audit_groups['manual_check'], audit_groups['passed'], audit_groups['not_applicable'])
                 
                 # Calculate automated testing metrics
                 automated_testable = len(failed_audits) + len(passed_audits)
@@ -706,8 +1131,7 @@ if st.session_state.results_df is not None:
                 if automated_testable > 0:
                     automated_pass_rate = int((len(passed_audits) / automated_testable) * 100)
                 
-                # Create summary data for visualization
-                categories = ["Failed", "Manual Check", "Passed", "Not Applicable"]
+                # Create summary data for visualization (same order as AUDIT_CHART_CATEGORIES)
                 counts = [len(failed_audits), len(manual_audits), len(passed_audits), len(na_audits)]
                 
                 # Create responsive columns - on mobile they'll stack vertically
@@ -717,43 +1141,8 @@ if st.session_state.results_df is not None:
                 with chart_col:
                     st.subheader(f"{device_type} Accessibility Audit Overview")
                     
-                    # Create the pie chart data
-                    summary_df = pd.DataFrame({
-                        "Category": categories,
-                        "Count": counts
-                    })
-                    
-                    # Create a pie chart
-                    chart = st_alt.Chart(summary_df).mark_arc(innerRadius=50).encode(
-                        theta=st_alt.Theta('Count:Q', stack=True),
-                        color=st_alt.Color('Category:N',
-                            scale=st_alt.Scale(
-                                domain=categories,
-                                range=['#ff4b4b', '#ffa500', '#00cc44', '#aaaaaa']
-                            ),
-                            legend=st_alt.Legend(
-                                title="Category",
-                                orient="bottom",
-                                labelFontSize=11,
-                                titleFontSize=12,
-                                columns=2
-                            )
-                        ),
-                        tooltip=[
-                            st_alt.Tooltip('Category:N', title='Category'),
-                            st_alt.Tooltip('Count:Q', title='Count'),
-                            st_alt.Tooltip('Count:Q', title='Percentage', format='.1%', aggregate='mean')
-                        ]
-                    ).properties(
-                        width=250,
-                        height=250,
-                        title={
-                            "text": f"Audit Results Distribution",
-                            "fontSize": 14,
-                            "anchor": "start"
-                        }
-                    )
-                    st.altair_chart(chart, use_container_width=False)
+                    # Chart spec is cached per set of counts, so switching URLs doesn't rebuild it
+                    st.vega_lite_chart(build_audit_chart_spec(tuple(counts)), use_container_width=False)
                 
                 # Right column - Automated Testing Results
                 with metrics_col:
@@ -809,12 +1198,11 @@ if st.session_state.results_df is not None:
                     with st.expander("❌ Failed Automated Tests", expanded=True):
                         st.markdown("These are accessibility issues that automated testing has detected and must be fixed:")
                         for audit in failed_audits:
-                            with st.container():
-                                st.markdown("---")
-                                st.warning(f"**{audit.get('title')}** (ID: `{audit.get('id')}`)")
-                                st.markdown(f"> {audit.get('description')}")
-                                if audit.get('details_snippet') and audit.get('details_snippet') != " (No specific item snippet)":
-                                    st.code(f"Example Snippet:\n{audit.get('details_snippet')}", language='html')
+                            st.markdown("---")
+                            st.warning(f"**{audit['title']}** (ID: `{audit['id']}`)")
+                            st.markdown(f"> {audit['description']}")
+                            if audit['details_snippet'] != NO_SNIPPET:
+                                st.code(f"Example Snippet:\n{audit['details_snippet']}", language='html')
                 
                 # Gemini AI Analysis Section
                 if failed_audits:
@@ -828,63 +1216,55 @@ if st.session_state.results_df is not None:
                             if st.button(f"Analyze {device_type} Issues with Gemini", key=f"gemini_{device_type.lower()}"):
                                 with st.spinner("Sending to Gemini for analysis..."):
                                     analysis = get_gemini_analysis(failed_audits, f"{current_url} ({device_type})")
-                                    
-                                    # Store the analysis in session state
-                                    st.session_state.gemini_analyses[analysis_key] = analysis
-                                    
-                                    # Update the results DataFrame to include the analysis
-                                    column_name = f'Gemini Analysis ({device_type})'
-                                    if column_name not in st.session_state.results_df.columns:
-                                        st.session_state.results_df[column_name] = ""
-                                    
-                                    st.session_state.results_df.loc[selected_index, column_name] = analysis
-                                    
+                                
+                                # Store the analysis in session state; errors are only shown, so the button stays for a retry
+                                if store_gemini_analysis(current_url, device_type, analysis):
                                     # Display the analysis
                                     st.markdown("### Gemini's Recommendations")
                                     st.markdown(analysis)
                                     
                                     # Rerun to update the UI
                                     st.rerun()
+                                else:
+                                    st.error(analysis)
                 
                 # Manual Verification Section
                 if manual_audits:
                     with st.expander("⚠️ Requires Manual Verification (Cannot Be Machine-Tested)", expanded=False):
                         st.warning("⚠️ **Important:** These aspects CANNOT be verified by automated tools and require human testing with assistive technologies.")
                         for audit in manual_audits:
-                            with st.container():
-                                st.markdown("---")
-                                st.info(f"**{audit.get('title')}** (ID: `{audit.get('id')}`) - {audit.get('displayMode')}")
-                                st.markdown(f"> {audit.get('description')}")
-                                
-                                if audit.get('details_snippet') and audit.get('details_snippet') != " (No specific item snippet)":
-                                    st.code(f"Example Snippet:\n{audit.get('details_snippet')}", language='html')
+                            st.markdown("---")
+                            st.info(f"**{audit['title']}** (ID: `{audit['id']}`) - {audit['displayMode']}")
+                            st.markdown(f"> {audit['description']}")
+                            
+                            if audit['details_snippet'] != NO_SNIPPET:
+                                st.code(f"Example Snippet:\n{audit['details_snippet']}", language='html')
                 
                 # Passed Audits Section
                 if passed_audits:
                     with st.expander("✅ Passed Automated Tests", expanded=False):
                         st.success("These accessibility requirements have been successfully verified by automated testing (remember: this is only ~30% of accessibility requirements):")
-                        for audit in passed_audits:
-                            st.markdown(f"- **{audit.get('title')}** (ID: `{audit.get('id')}`)")
+                        # One markdown element for the whole list instead of one per audit
+                        st.markdown(render_audits_html(passed_audits), unsafe_allow_html=True)
                 
                 # Not Applicable Section
                 if na_audits:
                     with st.expander("⏩ Not Applicable Audits", expanded=False):
                         st.markdown("These audits don't apply to the current page, often because the page doesn't contain the relevant elements:")
-                        for audit in na_audits:
-                            st.markdown(f"- **{audit.get('title')}** (ID: `{audit.get('id')}`)")
+                        st.markdown(render_audits_html(na_audits), unsafe_allow_html=True)
             
             # Display desktop results
-            with desktop_tab:
-                desktop_audits = st.session_state.desktop_results.get(selected_index, [])
+            if active_view == "Desktop Results":
+                desktop_audits = st.session_state.desktop_results.get(selected_index, {})
                 display_audit_results("Desktop", desktop_audits)
             
             # Display mobile results
-            with mobile_tab:
-                mobile_audits = st.session_state.mobile_results.get(selected_index, [])
+            elif active_view == "Mobile Results":
+                mobile_audits = st.session_state.mobile_results.get(selected_index, {})
                 display_audit_results("Mobile", mobile_audits)
             
             # Display Core Web Vitals results
-            with vitals_tab:
+            else:
                 st.subheader("Core Web Vitals Analysis")
                 
                 # Get vitals data for both desktop and mobile
@@ -934,14 +1314,8 @@ if st.session_state.results_df is not None:
                                 st.markdown(description)
                                 
                                 # Show thresholds for each metric
-                                if key == 'lcp':
-                                    st.info("**Thresholds:** Good < 2.5s | Needs Improvement 2.5s-4s | Poor > 4s")
-                                elif key == 'fid':
-                                    st.info("**Thresholds:** Good < 100ms | Needs Improvement 100ms-300ms | Poor > 300ms")
-                                elif key == 'cls':
-                                    st.info("**Thresholds:** Good < 0.1 | Needs Improvement 0.1-0.25 | Poor > 0.25")
-                                elif key == 'inp':
-                                    st.info("**Thresholds:** Good < 200ms | Needs Improvement 200ms-500ms | Poor > 500ms")
+                                if key in VITAL_THRESHOLDS:
+                                    st.info(VITAL_THRESHOLDS[key])
                         
                         # Additional metrics in an expander
                         additional = vitals_data.get('additional_metrics', {})
@@ -990,17 +1364,28 @@ if st.session_state.results_df is not None:
                     """)
 
     # --- Download Button (using session state df) ---
-    @st.cache_data # Cache the conversion
-    def convert_df_to_csv(df_to_convert):
+    def convert_df_to_csv(df_to_convert, gemini_analyses):
         
-        if 'Gemini Analysis (Desktop)' not in df_to_convert.columns:
-            df_to_convert['Gemini Analysis (Desktop)'] = ""
-        if 'Gemini Analysis (Mobile)' not in df_to_convert.columns:
-            df_to_convert['Gemini Analysis (Mobile)'] = ""
+        # Gemini analyses are keyed by "<url>_<device>"; map them onto the URL column in one pass.
+        # assign() returns a new frame, so the results DataFrame in session state is never modified.
+        export_df = df_to_convert.assign(**{
+            f'Gemini Analysis ({device_type})': (df_to_convert['urls'] + f"_{device_type.lower()}").map(gemini_analyses).fillna("")
+            for device_type in ("Desktop", "Mobile")
+        })
         
-        return df_to_convert.to_csv(index=False).encode('utf-8')
-
-    csv_output = convert_df_to_csv(st.session_state.results_df)
+        # Arrow's multithreaded C++ CSV writer is much faster than pandas' to_csv for long analysis text
+        # Writing into a BytesIO lets getvalue() hand back its bytes without another full copy
+        buffer = io.BytesIO()
+        pa_csv.write_csv(pa.Table.from_pandas(export_df, preserve_index=False), buffer)
+        return buffer.getvalue()
+
+    # The export only changes when a new run completes or a Gemini analysis is added, so keep
+    # the bytes in session state and rebuild them only when that fingerprint changes
+    csv_fingerprint = f"{st.session_state.results_run_id}:{len(st.session_state.gemini_analyses)}"
+    if st.session_state.csv_fingerprint != csv_fingerprint:
+        st.session_state.csv_output = convert_df_to_csv(st.session_state.results_df, st.session_state.gemini_analyses)
+        st.session_state.csv_fingerprint = csv_fingerprint
+    csv_output = st.session_state.csv_output
 
     st.download_button(
         label="Download Complete Analysis as CSV",